@@ -2,24 +2,40 @@ import os
 import yaml
 import markdown
 from markdown.extensions.toc import TocExtension
-from jinja2 import Environment, FileSystemLoader
-from datetime import datetime
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from datetime import date, datetime
 import argparse
+import functools
 import shutil
 import hashlib
 import json
+import pickle
 import re
+import tempfile
+import time
 from collections import defaultdict
-from html import escape
-from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
+from html import unescape
+from operator import itemgetter
 try:
     import dotenv
     dotenv.load_dotenv()
 except ImportError:
     pass
+import pygments
 from pygments.formatters import HtmlFormatter
 from pygments.util import ClassNotFound
 
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 DEFAULT_PYGMENTS_THEME = "native"
 TEMPLATE_DIR = "templates"
 CONFIG_FILE = "config.yaml"
@@ -30,23 +46,71 @@ POSTS_DIR = "content/posts"
 
 PAGE_SLUG_CACHE = ".cache/page-slugs.json"
 IMAGE_MANIFEST_PATH = ".cache/image-manifest.json"
+HASH_MANIFEST_PATH = ".cache/hashes.json"
+PAGE_CACHE_PATH = ".cache/pages.pkl"
+# Bump when parse_file starts producing different page data for the same input.
+PAGE_CACHE_VERSION = 1
+MARKDOWN_CACHE_DIR = ".cache/md"
+MARKDOWN_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+JINJA_CACHE_DIR = ".cache/jinja"
+RENDER_KEY_DIR = ".cache/out"
+PARALLEL_PARSE_MIN_FILES = 16
 GENERATED_THEME_PATH = "assets/css/generated.daisyui.css"
 GENERATED_FONTS_PATH = "assets/css/generated.fonts.css"
 GENERATED_SYNTAX_PATH = "assets/css/syntax.css"
 
 
+def _read_json(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _write_json(path, value, sort_keys=False):
+    if orjson is not None:
+        data = orjson.dumps(value, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    else:
+        data = json.dumps(value, sort_keys=sort_keys, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(data)
+
+
 def load_previous_slugs():
     try:
-        with open(PAGE_SLUG_CACHE, "r") as f:
-            return set(json.load(f))
+        return set(_read_json(PAGE_SLUG_CACHE))
     except:
         return set()
 
 
 def save_current_slugs(slugs):
     os.makedirs(os.path.dirname(PAGE_SLUG_CACHE), exist_ok=True)
-    with open(PAGE_SLUG_CACHE, "w", encoding="utf-8") as f:
-        json.dump(sorted(slugs), f)
+    _write_json(PAGE_SLUG_CACHE, sorted(slugs))
+
+
+def _iter_generated(directory, top_level, preserved_roots, generated_roots):
+    # Yields (path, is_dir) bottom-up so a directory only comes after all of
+    # its generated files. DirEntry carries the type from readdir, so no
+    # extra stat() is needed per entry.
+    with os.scandir(directory) as it:
+        entries = list(it)
+
+    for entry in entries:
+        if entry.is_dir():
+            entry_top = top_level or entry.name
+            if entry.is_symlink() or entry_top in preserved_roots:
+                continue
+            yield from _iter_generated(
+                entry.path, entry_top, preserved_roots, generated_roots
+            )
+            yield entry.path, True
+        elif (
+            top_level in generated_roots
+            or entry.name == "index.html"
+            or entry.name.endswith(".xml")
+        ):
+            yield entry.path, False
 
 
 def clean_output(directory):
@@ -66,54 +130,65 @@ def clean_output(directory):
     generated_roots = {"blog", "tags", "posts"}
 
     removed_any = False
-    for root, _, files in os.walk(directory, topdown=False):
-        rel_root = os.path.relpath(root, directory)
-        if rel_root == ".":
-            rel_root = ""
-        top_level = rel_root.split(os.sep)[0] if rel_root else ""
-
-        if top_level in preserved_roots:
-            continue
-
-        for filename in files:
-            delete_file = False
-            if top_level in generated_roots:
-                delete_file = True
-            elif filename == "index.html" or filename.endswith(".xml"):
-                delete_file = True
-
-            if delete_file:
-                file_path = os.path.join(root, filename)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    removed_any = True
-                    print(f"Deleted: {file_path}")
-
-        if rel_root and top_level not in preserved_roots and not os.listdir(root):
-            os.rmdir(root)
+    for path, is_dir in _iter_generated(
+        directory, "", preserved_roots, generated_roots
+    ):
+        if is_dir:
+            try:
+                os.rmdir(path)
+            except OSError:
+                # Not empty: it still holds non-generated files.
+                continue
             removed_any = True
-            print(f"Deleted empty directory: {root}")
+            print(f"Deleted empty directory: {path}")
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed_any = True
+            print(f"Deleted: {path}")
 
     if not removed_any:
         print("No generated files found to delete.")
 
 
-def has_file_changed(filepath, cache_dir=".cache"):
-    os.makedirs(cache_dir, exist_ok=True)
-    rel = os.path.relpath(filepath)
-    file_hash = hashlib.md5(open(filepath, "rb").read()).hexdigest()
-    safe_name = rel.replace(os.sep, "__") + ".hash"
-    cache_file = os.path.join(cache_dir, safe_name)
-
-    if os.path.exists(cache_file):
-        with open(cache_file, "r", encoding="utf-8") as f:
-            cached_hash = f.read().strip()
-        if cached_hash == file_hash:
-            return False
-
-    with open(cache_file, "w", encoding="utf-8") as f:
-        f.write(file_hash)
-    return True
+def _hash_file(filepath):
+    h = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_hash_manifest(path=HASH_MANIFEST_PATH):
+    try:
+        return _read_json(path)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_hash_manifest(manifest, path=HASH_MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_json(path, manifest, sort_keys=True)
+
+
+def has_file_changed(filepath, manifest):
+    rel = os.path.relpath(filepath).replace(os.sep, "/")
+    cached = manifest.get(rel) or {}
+
+    # A matching mtime and size skips hashing the file at all.
+    st = os.stat(filepath)
+    if cached.get("mtime_ns") == st.st_mtime_ns and cached.get("size") == st.st_size:
+        return False
+
+    file_hash = _hash_file(filepath)
+    manifest[rel] = {
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "hash": file_hash,
+    }
+    return cached.get("hash") != file_hash
 
 
 def _ensure_sequence(value):
@@ -124,17 +199,25 @@ def _ensure_sequence(value):
     return [value]
 
 
+_THEME_VAL_SPECIAL = re.compile(r'[\s;:"]')
+
+
+@functools.lru_cache(maxsize=1024)
+def _format_css_str(value):
+    if not value:
+        return '""'
+    if _THEME_VAL_SPECIAL.search(value):
+        return json.dumps(value)
+    return value
+
+
 def _format_css_scalar(value):
     if isinstance(value, bool):
         return "true" if value else "false"
     if isinstance(value, (int, float)) and not isinstance(value, bool):
         return str(value)
     if isinstance(value, str):
-        if not value:
-            return '""'
-        if re.search(r"[\s;:\"]", value):
-            return json.dumps(value)
-        return value
+        return _format_css_str(value)
     return json.dumps(value)
 
 
@@ -160,9 +243,10 @@ def normalize_theme_config(config):
 
     ordered = []
     seen = set()
-    if default_theme:
-        seen.add(default_theme)
-        ordered.append(default_theme)
+    default_name = str(default_theme).strip()
+    if default_name:
+        seen.add(default_name)
+        ordered.append(default_name)
 
     for entry in include_list:
         if not entry:
@@ -184,24 +268,36 @@ def normalize_theme_config(config):
 def write_theme_file(config, output_path=GENERATED_THEME_PATH):
     theme = config.get("theme") or {}
     print(f"DEBUG: write_theme_file theme config: {theme}")
+    # normalize_theme_config already strips and de-duplicates the include list.
     include = theme.get("include") or []
-    include_list = _ensure_sequence(include)
 
-    names = []
-    seen = set()
-    for entry in include_list:
-        name = str(entry).strip()
-        if not name or name in seen:
-            continue
-        names.append(name)
-        seen.add(name)
+    # Stream into a temp file and swap it in, so a block that fails to format
+    # leaves the previous CSS in place instead of a truncated file. A plain
+    # open() (rather than mkstemp) keeps the usual file permissions.
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for index, block in enumerate(_iter_theme_blocks(theme, include)):
+                if index:
+                    f.write("\n\n")
+                f.write(block)
+            f.write("\n")
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
 
-    css_blocks = []
-    if names:
-        joined_names = ", ".join(names)
-        css_blocks.append(f'@plugin "daisyui" {{\n  themes: {joined_names};\n}}')
+
+def _iter_theme_blocks(theme, include):
+    if include:
+        joined_names = ", ".join(include)
+        yield f'@plugin "daisyui" {{\n  themes: {joined_names};\n}}'
     else:
-        css_blocks.append('@plugin "daisyui" {\n  themes: all;\n}')
+        yield '@plugin "daisyui" {\n  themes: all;\n}'
 
     custom = theme.get("custom")
     custom_items = custom.items() if isinstance(custom, dict) else []
@@ -246,12 +342,7 @@ def write_theme_file(config, output_path=GENERATED_THEME_PATH):
             continue
 
         lines.append("}")
-        css_blocks.append("\n".join(lines))
-
-    css_content = "\n\n".join(css_blocks) + "\n"
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(css_content)
+        yield "\n".join(lines)
 
 
 def _normalize_font_family(value):
@@ -424,7 +515,7 @@ def generate_styles(
     fonts_path=GENERATED_FONTS_PATH,
 ):
     with open(config_path, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f) or {}
+        config = yaml.load(f, Loader=_SafeLoader) or {}
     normalize_theme_config(config)
     pygments_theme = resolve_pygments_theme(config)
     write_theme_file(config, theme_path)
@@ -497,6 +588,89 @@ def build_markdown(pygments_theme, markdown_config=None):
     )
 
 
+_MARKDOWN_INSTANCES = {}
+
+
+def get_markdown(pygments_theme, markdown_config=None):
+    # Building a Markdown instance registers every extension, so keep one per
+    # configuration and reset it between documents instead.
+    signature = markdown_signature(pygments_theme, markdown_config)
+    md = _MARKDOWN_INSTANCES.get(signature)
+    if md is None:
+        md = build_markdown(pygments_theme, markdown_config)
+        _MARKDOWN_INSTANCES[signature] = md
+    return md
+
+
+def markdown_signature(pygments_theme, markdown_config=None):
+    # Anything that changes the rendered HTML for the same markdown body has
+    # to be part of the cache key, otherwise stale output survives a theme
+    # or extension change.
+    return json.dumps(
+        [
+            markdown.__version__,
+            pygments.__version__,
+            pygments_theme,
+            markdown_config or {},
+        ],
+        sort_keys=True,
+        default=str,
+    )
+
+
+def md_to_html_cached(
+    body, pygments_theme, markdown_config=None, cache_dir=MARKDOWN_CACHE_DIR
+):
+    ext_sig = markdown_signature(pygments_theme, markdown_config).encode("utf-8")
+    key = hashlib.blake2b(body.encode("utf-8") + ext_sig, digest_size=16).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{key}.html")
+
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            html_data = f.read()
+        # Refresh the mtime so prune_markdown_cache keeps entries still in use.
+        os.utime(cache_path)
+        return html_data
+    except FileNotFoundError:
+        pass
+
+    md = get_markdown(pygments_theme, markdown_config)
+    html_data = md.reset().convert(body)
+
+    # Write to a temp file and rename it into place, so an interrupted build
+    # or a concurrent worker never leaves a truncated entry behind.
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(html_data)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return html_data
+
+
+def prune_markdown_cache(cache_dir=MARKDOWN_CACHE_DIR, max_age=MARKDOWN_CACHE_MAX_AGE):
+    # Pages that have not changed are served from the pages cache and never
+    # touch their entry here, so anything idle this long is safe to drop.
+    cutoff = time.time() - max_age
+    try:
+        it = os.scandir(cache_dir)
+    except FileNotFoundError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
 def load_templates(env, template_dir=TEMPLATE_DIR, allowed_extensions=(".html", ".jinja", ".jinja2", ".j2")):
     templates = {}
     for root, _, files in os.walk(template_dir):
@@ -523,11 +697,15 @@ def parse_file(filepath, pygments_theme, markdown_config=None):
         return None, None
 
     if file_content.startswith("---"):
+        frontmatter_end = file_content.find("---", 3)
         try:
-            parts = file_content.split("---", 2)
-            page_config = yaml.safe_load(parts[1]) or {}
-            markdown_data = parts[2]
-        except (IndexError, yaml.YAMLError) as e:
+            if frontmatter_end == -1:
+                raise ValueError("missing closing '---'")
+            page_config = yaml.load(
+                file_content[3:frontmatter_end], Loader=_SafeLoader
+            ) or {}
+            markdown_data = file_content[frontmatter_end + 3:]
+        except (ValueError, yaml.YAMLError) as e:
             print(f"Error parsing YAML frontmatter in {filepath}: {e}")
             page_config = {}
             markdown_data = file_content
@@ -535,9 +713,7 @@ def parse_file(filepath, pygments_theme, markdown_config=None):
         page_config = {}
         markdown_data = file_content
 
-    md = build_markdown(pygments_theme, markdown_config)
-    html_data = md.convert(markdown_data)
-    md.reset()
+    html_data = md_to_html_cached(markdown_data, pygments_theme, markdown_config)
 
     rel_path = os.path.relpath(filepath, CONTENT_DIR)
     
@@ -570,18 +746,116 @@ def parse_file(filepath, pygments_theme, markdown_config=None):
             except Exception:
                 pass
 
+    # Parsed once here so collection and tag sorting don't strptime per item.
+    try:
+        page_config["_date_key"] = date.fromisoformat(page_config["date"])
+    except (KeyError, TypeError, ValueError):
+        page_config["_date_key"] = date.min
+
     return page_config, html_data
 
 
+def _iter_markdown_files(directory):
+    # Same order as os.walk: a directory's files first, then its subdirectories.
+    with os.scandir(directory) as it:
+        entries = list(it)
+
+    subdirs = []
+    for entry in entries:
+        if entry.is_file():
+            if entry.name.endswith(".md"):
+                yield entry.path
+        elif entry.is_dir() and not entry.is_symlink():
+            subdirs.append(entry.path)
+
+    for subdir in subdirs:
+        yield from _iter_markdown_files(subdir)
+
+
+def parse_files(filepaths, pygments_theme, markdown_config=None):
+    # Pages are independent, so markdown conversion (the CPU-heavy part) can be
+    # fanned out across processes. Rendering stays in the main process.
+    parse_one = functools.partial(
+        parse_file, pygments_theme=pygments_theme, markdown_config=markdown_config
+    )
+    # Pool startup (and re-importing markdown/pygments on spawn platforms)
+    # costs more than parsing a handful of files, so small batches, which is
+    # the usual case once the pages cache is warm, run serially.
+    workers = os.cpu_count() or 1
+    if workers <= 1 or len(filepaths) < max(PARALLEL_PARSE_MIN_FILES, 2 * workers):
+        return [parse_one(filepath) for filepath in filepaths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(parse_one, filepaths))
+
+
+def load_page_cache(path=PAGE_CACHE_PATH):
+    try:
+        with open(path, "rb") as f:
+            cache = pickle.load(f)
+    except Exception:
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_page_cache(cache, path=PAGE_CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def parse_files_cached(filepaths, pygments_theme, markdown_config, page_cache):
+    # Reuse the parsed frontmatter and HTML of files whose mtime and size are
+    # unchanged since the last build. page_cache is updated in place and only
+    # keeps entries for the files passed in.
+    signature = markdown_signature(pygments_theme, markdown_config)
+    results = {}
+    stale = []
+    stats = {}
+    for filepath in filepaths:
+        try:
+            st = os.stat(filepath)
+        except FileNotFoundError:
+            stale.append(filepath)
+            continue
+        stats[filepath] = (st.st_mtime_ns, st.st_size)
+        cached = page_cache.get(filepath)
+        if (
+            cached
+            and cached["stat"] == stats[filepath]
+            and cached["signature"] == signature
+            and cached.get("version") == PAGE_CACHE_VERSION
+        ):
+            results[filepath] = (cached["page_config"], cached["html"])
+        else:
+            stale.append(filepath)
+
+    for filepath, parsed in zip(
+        stale, parse_files(stale, pygments_theme, markdown_config)
+    ):
+        results[filepath] = parsed
+
+    page_cache.clear()
+    for filepath, (page_config, html_data) in results.items():
+        if page_config is None or filepath not in stats:
+            continue
+        page_cache[filepath] = {
+            "stat": stats[filepath],
+            "signature": signature,
+            "version": PAGE_CACHE_VERSION,
+            "page_config": page_config,
+            "html": html_data,
+        }
+
+    return [results[filepath] for filepath in filepaths]
+
+
 def tag_pages(tag_template, site_config, tags=None, image_manifest=None):
     tags = tags or {}
     tags_dir = os.path.join(OUTPUT_DIR, "tags")
     os.makedirs(tags_dir, exist_ok=True)
 
     for tag_name, posts_with_tag in tags.items():
-        posts_with_tag.sort(
-            key=lambda x: datetime.strptime(x["date"], "%Y-%m-%d"), reverse=True
-        )
+        posts_with_tag.sort(key=itemgetter("_date_key"), reverse=True)
         tag_page_html = tag_template.render(
             site=site_config,
             tag_name=tag_name,
@@ -590,17 +864,47 @@ def tag_pages(tag_template, site_config, tags=None, image_manifest=None):
         )
         tag_page_html = replace_images_with_processed(tag_page_html, image_manifest)
         output_path = os.path.join(tags_dir, f"{tag_name}.html")
-        with open(output_path, "w", encoding="utf-8") as f:
+        with open(output_path, "w", buffering=1 << 20, encoding="utf-8") as f:
             f.write(tag_page_html)
         print(f"Generated tag page: tags/{tag_name}.html")
 
 
+def compute_render_signature(
+    site_config,
+    context_data=None,
+    template_dir=TEMPLATE_DIR,
+    manifest_path=IMAGE_MANIFEST_PATH,
+):
+    # Everything shared by all pages that can change their rendered output.
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((site_config, context_data or {})).encode("utf-8"))
+    for root, dirs, files in os.walk(template_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            h.update(path.encode("utf-8"))
+            with open(path, "rb") as f:
+                h.update(f.read())
+    try:
+        with open(manifest_path, "rb") as f:
+            h.update(f.read())
+    except FileNotFoundError:
+        pass
+    return h.hexdigest()
+
+
+def _render_key_path(url):
+    name = url.strip("/").replace("/", "__") or "index"
+    return os.path.join(RENDER_KEY_DIR, f"{name}.key")
+
+
 def render_page(
     page_config,
     html_data,
     site_config,
     templates,
     image_manifest=None,
+    render_signature=None,
     **context_data,
 ):
     layout = page_config.get("layout") or "post"
@@ -611,6 +915,30 @@ def render_page(
         )
         return
 
+    if page_config["url"] == "/":
+        output_path = os.path.join(OUTPUT_DIR, "index.html")
+    else:
+        output_path = os.path.join(
+            OUTPUT_DIR, page_config["url"].lstrip("/"), "index.html"
+        )
+
+    # render_signature already covers context_data; it is only passed for
+    # --file rebuilds, since a full build cleans every output first.
+    render_key = None
+    key_path = _render_key_path(page_config["url"])
+    if render_signature is not None and os.path.exists(output_path):
+        render_key = hashlib.blake2b(
+            repr((page_config, html_data, render_signature)).encode("utf-8"),
+            digest_size=16,
+        ).hexdigest()
+        try:
+            with open(key_path, "r", encoding="utf-8") as f:
+                if f.read() == render_key:
+                    print(f"Unchanged: {page_config['url']}")
+                    return False
+        except FileNotFoundError:
+            pass
+
     template = templates[layout]
 
     render_details = {"site": site_config, "page": page_config, "content": html_data}
@@ -619,192 +947,238 @@ def render_page(
     final_html = template.render(render_details)
     final_html = replace_images_with_processed(final_html, image_manifest)
 
-    if page_config["url"] == "/":
-        output_path = os.path.join(OUTPUT_DIR, "index.html")
-    else:
-        output_path = os.path.join(
-            OUTPUT_DIR, page_config["url"].lstrip("/"), "index.html"
-        )
-
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path, "w", encoding="utf-8") as f:
+    with open(output_path, "w", buffering=1 << 20, encoding="utf-8") as f:
         f.write(final_html)
     print(
         f"Generated: {page_config['url'] if page_config['url'] != '/' else '/index.html'}"
     )
 
+    if render_key is not None:
+        os.makedirs(RENDER_KEY_DIR, exist_ok=True)
+        with open(key_path, "w", encoding="utf-8") as f:
+            f.write(render_key)
+    return True
 
 
 def load_image_manifest(path=IMAGE_MANIFEST_PATH):
     if not os.path.exists(path):
         return {}
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError as exc:
+        return _prebuild_manifest(_read_json(path))
+    except ValueError as exc:
         print(f"Warning: Unable to parse image manifest {path}: {exc}")
         return {}
 
 
+# Same replacements as html.escape(..., quote=True), done in a single pass.
+_HTML_ATTR_ESC = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#x27;",
+})
+
+
 def _render_attributes(attrs):
     parts = []
     for name, value in attrs:
         if value is None:
             parts.append(f" {name}")
         else:
-            parts.append(f' {name}="{escape(str(value), quote=True)}"')
+            parts.append(f' {name}="{str(value).translate(_HTML_ATTR_ESC)}"')
     return "".join(parts)
 
 
-def _build_picture_element(attrs, manifest_entry):
+def _variant_url(variant):
+    path = variant["path"]
+    return path if path.startswith("http") else f"/{path}"
+
+
+def _prebuild_manifest_entry(manifest_entry):
     if not manifest_entry:
         return None
 
-    attrs_dict = {name.lower(): value for name, value in attrs}
-    sizes_value = attrs_dict.get("data-img-sizes") or attrs_dict.get("sizes") or "100vw"
-
     format_priority = ["avif", "webp", "jpg", "jpeg", "png"]
     fallback_priority = ["jpg", "jpeg", "png", "webp", "avif"]
     mime_overrides = {"jpg": "image/jpeg", "jpeg": "image/jpeg"}
 
+    # Variants without a path or width are dropped once, up front, and each
+    # format is sorted a single time for both the <source> and fallback use.
+    usable = {
+        fmt: sorted(
+            [v for v in variants if v.get("path") and v.get("width")],
+            key=itemgetter("width"),
+        )
+        for fmt, variants in manifest_entry.items()
+        if variants
+    }
+
     sources = []
     for fmt in format_priority:
-        variants = manifest_entry.get(fmt)
-        if not variants:
-            continue
-        sorted_variants = sorted(
-            (v for v in variants if v.get("path") and v.get("width")),
-            key=lambda item: item["width"],
-        )
+        sorted_variants = usable.get(fmt)
         if not sorted_variants:
             continue
         srcset = ", ".join(
-            f"{variant['path'] if variant['path'].startswith('http') else '/' + variant['path']} {variant['width']}w"
+            f"{_variant_url(variant)} {variant['width']}w"
             for variant in sorted_variants
         )
         mime = mime_overrides.get(fmt, f"image/{fmt}")
-        sources.append(
-            f'<source type="{mime}" srcset="{srcset}" sizes="{sizes_value}">'
-        )
+        sources.append((mime, srcset))
 
     if not sources:
         return None
 
-    fallback_format = next(
-        (fmt for fmt in fallback_priority if manifest_entry.get(fmt)), None
-    )
+    # The fallback format is picked by presence in the manifest, even if all of
+    # its variants turn out to be unusable.
+    fallback_format = next((fmt for fmt in fallback_priority if fmt in usable), None)
     if not fallback_format:
         return None
 
-    fallback_variants = sorted(
-        (
-            v
-            for v in manifest_entry[fallback_format]
-            if v.get("path") and v.get("width")
-        ),
-        key=lambda item: item.get("width", 0),
-    )
+    fallback_variants = usable[fallback_format]
     if not fallback_variants:
         return None
 
-    if fallback_variants[-1]['path'].startswith("http"):
-        fallback_src = fallback_variants[-1]['path']
-    else:
-        fallback_src = f"/{fallback_variants[-1]['path']}"
+    return {
+        "sources": sources,
+        "sources_by_sizes": {},
+        "fallback_src": _variant_url(fallback_variants[-1]),
+        "fallback_srcset": ", ".join(
+            f"{_variant_url(variant)} {variant['width']}w"
+            for variant in fallback_variants
+        ),
+    }
+
+
+class _PrebuiltManifest(dict):
+    # Matches any usable manifest basename; None when no entry can produce a
+    # <picture>.
+    names_re = None
+
 
-    fallback_srcset = ", ".join(
-        f"{variant['path'] if variant['path'].startswith('http') else '/' + variant['path']} {variant['width']}w" 
-        for variant in fallback_variants
+def _prebuild_manifest(manifest):
+    # Sorting variants and building srcset strings only depends on the
+    # manifest, so do it once here rather than for every <img> on every page.
+    prebuilt = _PrebuiltManifest(
+        (name, _prebuild_manifest_entry(entry))
+        for name, entry in (manifest or {}).items()
     )
+    names = [name for name, entry in prebuilt.items() if entry]
+    if names:
+        prebuilt.names_re = re.compile(
+            "|".join(map(re.escape, sorted(names, key=len, reverse=True)))
+        )
+    return prebuilt
+
+
+def _build_picture_element(attrs, manifest_entry):
+    if not manifest_entry:
+        return None
+
+    attrs_dict = {name.lower(): value for name, value in attrs}
+    sizes_value = attrs_dict.get("data-img-sizes") or attrs_dict.get("sizes") or "100vw"
+
+    sources_html = manifest_entry["sources_by_sizes"].get(sizes_value)
+    if sources_html is None:
+        sources_html = "".join(
+            f'<source type="{mime}" srcset="{srcset}" sizes="{sizes_value}">'
+            for mime, srcset in manifest_entry["sources"]
+        )
+        manifest_entry["sources_by_sizes"][sizes_value] = sources_html
 
     filtered_attrs = [
         (name, value)
         for (name, value) in attrs
         if name.lower() not in {"src", "srcset", "sizes", "data-img-sizes"}
     ]
-    fallback_attrs = [("src", fallback_src)] + filtered_attrs
-    if fallback_srcset:
-        fallback_attrs.append(("srcset", fallback_srcset))
+    fallback_attrs = [("src", manifest_entry["fallback_src"])] + filtered_attrs
+    if manifest_entry["fallback_srcset"]:
+        fallback_attrs.append(("srcset", manifest_entry["fallback_srcset"]))
     fallback_attrs.append(("sizes", sizes_value))
 
     img_tag = "<img{}>".format(_render_attributes(fallback_attrs))
-    sources_html = "".join(sources)
     return f"<picture>{sources_html}{img_tag}</picture>"
 
 
-class ImageReplacementParser(HTMLParser):
-    def __init__(self, manifest):
-        super().__init__(convert_charrefs=False)
-        self.manifest = manifest or {}
-        self.output = []
-
-    def handle_starttag(self, tag, attrs):
-        self._handle_start(tag, attrs)
-
-    def handle_startendtag(self, tag, attrs):
-        self._handle_start(tag, attrs)
-
-    def handle_endtag(self, tag):
-        self.output.append(f"</{tag}>")
-
-    def handle_data(self, data):
-        self.output.append(data)
-
-    def handle_comment(self, data):
-        self.output.append(f"<!--{data}-->")
-
-    def handle_decl(self, decl):
-        self.output.append(f"<!{decl}>")
-
-    def handle_entityref(self, name):
-        self.output.append(f"&{name};")
-
-    def handle_charref(self, name):
-        self.output.append(f"&#{name};")
-
-    def handle_pi(self, data):
-        self.output.append(f"<?{data}>")
-
-    def _handle_start(self, tag, attrs):
-        if tag.lower() == "img":
-            replacement = self._build_replacement(attrs)
-            if replacement:
-                self.output.append(replacement)
-                return
-        raw = self.get_starttag_text()
-        if raw:
-            self.output.append(raw)
+# Comments, raw-text elements and every start tag are matched whole, so an
+# "<img" inside a comment, a script or another tag's quoted attribute value is
+# never mistaken for an image. Only start tags named img are rewritten.
+_START_TAG_RE = re.compile(
+    r"<!--.*?-->"
+    r"|<(script|style)\b.*?</\1\s*>"
+    r"|<([A-Za-z][^\s/>]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>",
+    re.IGNORECASE | re.DOTALL,
+)
+_IMG_HINT_RE = re.compile(r"<img\b", re.IGNORECASE)
+_ATTR_RE = re.compile(
+    r"([^\s\"'>/=]+)"
+    r"(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s\"'=<>`]+)))?"
+)
+
+
+def _parse_attrs(attr_str):
+    attrs = []
+    for match in _ATTR_RE.finditer(attr_str):
+        name, double, single, bare = match.groups()
+        value = next((v for v in (double, single, bare) if v is not None), None)
+        if value is not None:
+            value = unescape(value)
+        attrs.append((name.lower(), value))
+    return attrs
+
+
+def _build_img_replacement(attrs, manifest):
+    attrs_dict = {k.lower(): v for k, v in attrs}
+    src = attrs_dict.get("src")
+    if not src:
+        return None
 
-    def _build_replacement(self, attrs):
-        attrs_dict = {k.lower(): v for k, v in attrs}
-        src = attrs_dict.get("src")
-        if not src:
-            return None
+    normalized = src.split("?", 1)[0].split("#", 1)[0].lstrip("/")
+    if normalized.startswith("./"):
+        normalized = normalized[2:]
+    if "assets/images/" not in normalized:
+        return None
 
-        normalized = src.split("?", 1)[0].split("#", 1)[0].lstrip("/")
-        if normalized.startswith("./"):
-            normalized = normalized[2:]
-        if "assets/images/" not in normalized:
-            return None
+    relative = normalized.split("assets/images/", 1)[1]
+    manifest_entry = manifest.get(os.path.basename(relative))
+    if not manifest_entry:
+        return None
 
-        relative = normalized.split("assets/images/", 1)[1]
-        manifest_entry = self.manifest.get(os.path.basename(relative))
-        if not manifest_entry:
-            return None
+    return _build_picture_element(attrs, manifest_entry)
 
-        return _build_picture_element(attrs, manifest_entry)
 
-    def get_html(self):
-        return "".join(self.output)
+def _may_reference_manifest(html, names_re):
+    if "assets/images/" in html and names_re.search(html):
+        return True
+    # src values are unescaped before the manifest lookup, so the path or the
+    # basename may be spelled with character references in the raw HTML.
+    if "&" in html:
+        text = unescape(html)
+        return "assets/images/" in text and names_re.search(text) is not None
+    return False
 
 
 def replace_images_with_processed(html, manifest):
     if not html or not manifest:
         return html
-    parser = ImageReplacementParser(manifest)
-    parser.feed(html)
-    parser.close()
-    return parser.get_html()
+    if not isinstance(manifest, _PrebuiltManifest):
+        # load_image_manifest already prebuilds; a manifest read some other
+        # way is raw JSON and has to be prebuilt before it can be used.
+        manifest = _prebuild_manifest(manifest)
+    if manifest.names_re is None or not _IMG_HINT_RE.search(html):
+        return html
+    if not _may_reference_manifest(html, manifest.names_re):
+        return html
+
+    def _replace(match):
+        tag = match.group(2)
+        if tag is None or tag.lower() != "img":
+            return match.group(0)
+        replacement = _build_img_replacement(_parse_attrs(match.group(3)), manifest)
+        return replacement or match.group(0)
+
+    return _START_TAG_RE.sub(_replace, html)
 
 
 def main():
@@ -816,6 +1190,8 @@ def main():
 
     if args.clean:
         clean_output(OUTPUT_DIR)
+        shutil.rmtree(RENDER_KEY_DIR, ignore_errors=True)
+        shutil.rmtree(MARKDOWN_CACHE_DIR, ignore_errors=True)
         if os.path.exists(PAGE_SLUG_CACHE):
             os.remove(PAGE_SLUG_CACHE)
         print("generated files are deleted.")
@@ -829,7 +1205,13 @@ def main():
         return
 
     site_config, pygments_theme = generate_styles()
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+    os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        bytecode_cache=FileSystemBytecodeCache(directory=JINJA_CACHE_DIR),
+        auto_reload=False,
+        cache_size=-1,
+    )
     templates = load_templates(env)
     image_manifest = load_image_manifest()
 
@@ -848,23 +1230,25 @@ def main():
                 os.remove(PAGE_SLUG_CACHE)
             return
 
-        if not has_file_changed(args.file):
-            print(
-                f"No changes detected in {args.file} based on cache; rebuilding anyway."
-            )
+        hash_manifest = load_hash_manifest()
+        file_changed = has_file_changed(args.file, hash_manifest)
+        save_hash_manifest(hash_manifest)
 
         page_data, html_content = parse_file(
             args.file, pygments_theme, site_config.get("markdown")
         )
         if page_data is None or html_content is None:
             return
-        render_page(
+        rendered = render_page(
             page_data,
             html_content,
             site_config,
             templates,
             image_manifest=image_manifest,
+            render_signature=compute_render_signature(site_config),
         )
+        if rendered is False and not file_changed:
+            print(f"No changes detected in {args.file} based on cache; skipped rebuild.")
     else:
         print("Running a full build...")
         sitemap_list = []
@@ -873,6 +1257,9 @@ def main():
         tags = {}
 
         clean_output(OUTPUT_DIR)
+        # Every page is rewritten below, so keys from earlier --file rebuilds
+        # no longer describe what is on disk.
+        shutil.rmtree(RENDER_KEY_DIR, ignore_errors=True)
 
         current_slugs = set()
         previous_slugs = load_previous_slugs()
@@ -880,36 +1267,36 @@ def main():
         # Dynamic collections: layout -> list of pages
         collections = defaultdict(list)
 
-        for root, _, files in os.walk(CONTENT_DIR):
-            for filename in files:
-                if not filename.endswith(".md"):
-                    continue
-                
-                filepath = os.path.join(root, filename)
-                page_data, html_content = parse_file(
-                    filepath, pygments_theme, site_config.get("markdown")
-                )
-                if not page_data:
-                    continue
-                if str(page_data.get("draft")).lower() in ("true", "1", "yes"):
-                    continue
+        filepaths = list(_iter_markdown_files(CONTENT_DIR))
+
+        page_cache = load_page_cache()
+        parsed_files = parse_files_cached(
+            filepaths, pygments_theme, site_config.get("markdown"), page_cache
+        )
+        save_page_cache(page_cache)
+        prune_markdown_cache()
+        for filepath, (page_data, html_content) in zip(filepaths, parsed_files):
+            if not page_data:
+                continue
+            if str(page_data.get("draft")).lower() in ("true", "1", "yes"):
+                continue
                 
-                # Determine slug/key for caching mechanism
-                # We use the relative path without extension as the key
-                rel_path = os.path.relpath(filepath, CONTENT_DIR)
-                slug_key = os.path.splitext(rel_path)[0].replace(os.sep, "/")
-                current_slugs.add(slug_key)
-
-                pages.append({"data": page_data, "content": html_content})
-                sitemap_list.append(page_data["url"])
+            # Determine slug/key for caching mechanism
+            # We use the relative path without extension as the key
+            rel_path = os.path.relpath(filepath, CONTENT_DIR)
+            slug_key = os.path.splitext(rel_path)[0].replace(os.sep, "/")
+            current_slugs.add(slug_key)
+
+            pages.append({"data": page_data, "content": html_content})
+            sitemap_list.append(page_data["url"])
                 
-                layout = page_data.get("layout")
-                if layout:
-                    collections[layout].append(page_data)
+            layout = page_data.get("layout")
+            if layout:
+                collections[layout].append(page_data)
                     
-                    if layout == "post":
-                        for tag in page_data.get("tags") or []:
-                             tags.setdefault(tag, []).append(page_data)
+                if layout == "post":
+                    for tag in page_data.get("tags") or []:
+                         tags.setdefault(tag, []).append(page_data)
 
         removed = previous_slugs - current_slugs
         for slug in removed:
@@ -933,11 +1320,7 @@ def main():
             
             if has_date:
                  items.sort(
-                    key=lambda x: (
-                        datetime.strptime(x["date"], "%Y-%m-%d")
-                        if x.get("date") and isinstance(x.get("date"), str)
-                        else datetime.min
-                    ),
+                    key=lambda x: x.get("_date_key", date.min),
                     reverse=True,
                 )
             elif has_order: